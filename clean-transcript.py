@@ -3,6 +3,14 @@ import re
 import sys
 import os
 import difflib
+import itertools
+import string
+
+try:
+    # rapidfuzz's bit-parallel ratio is much faster than difflib on long lines
+    from rapidfuzz.fuzz import ratio as _fuzz_ratio
+except ImportError:
+    _fuzz_ratio = None
 
 """
 Explanation
@@ -28,140 +36,234 @@ must become TS1 BANANA
 
 """
 
+# Patterns are compiled once at import time; the cleaning functions run per
+# caption, so per-call re.sub/re.compile would hit the re module cache each time.
+_SPEAKER_PREFIX_RE = re.compile(r'^\w+:\s+(\[\d{2}:\d{2}:\d{2}\.\d{3} --> \d{2}:\d{2}:\d{2}\.\d{3}\])')
+_WHITESPACE_RE = re.compile(r'\s+')
+_ENTITY_RE = re.compile(r'&[a-zA-Z]+;')
+# Timestamps are plain ASCII digits; re.ASCII keeps \d/\s on the small ASCII tables
+_TS_RANGE_RE = re.compile(r'(\d{2}:\d{2}:\d{2})\.\d{3}\s*-->', re.ASCII)
+
+# Non-blank lines read from the head of stdin when deciding whether input is VTT
+VTT_SNIFF_LINES = 20
+
+def strip_tags(text):
+    """Remove <...> tags (same matches as r'<[^>]+>') in one str.find scan."""
+    out = []
+    i = 0
+    while True:
+        j = text.find('<', i)
+        if j < 0:
+            break
+        k = text.find('>', j + 1)
+        if k < 0:
+            break
+        if k == j + 1:
+            # '<>' is not a tag; keep the '<' and rescan from the '>'
+            out.append(text[i:k])
+            i = k
+        else:
+            out.append(text[i:j])
+            i = k + 1
+    out.append(text[i:])
+    return ''.join(out)
+
 def clean_text(text):
     """Remove HTML tags, extra spaces, and trim whitespace."""
-    text = re.sub(r'<[^>]+>', '', text)
+    if '<' in text:
+        text = strip_tags(text)
     # Remove speaker prefixes like "Robert:" or "Jim:" ONLY at the beginning of the line followed by timestamp in square brackets
-    text = re.sub(r'^\w+:\s+(\[\d{2}:\d{2}:\d{2}\.\d{3} --> \d{2}:\d{2}:\d{2}\.\d{3}\])', r'\1', text)
+    text = _SPEAKER_PREFIX_RE.sub(r'\1', text)
     # Remove leading whitespace
-    text = re.sub(r'^\s+', '', text)
+    text = text.lstrip()
     # never Remove [SPEAKER_TURN] tags - preserve them exactly
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     # Remove any remaining HTML entities like &quot;
-    text = re.sub(r'&[a-zA-Z]+;', ' ', text)
+    if '&' in text:
+        text = _ENTITY_RE.sub(' ', text)
     return text.strip()
 
 def is_prefix(a, b):
     """Return True if string a is a prefix of string b."""
     return b.startswith(a)
 
-def process_vtt(content):
+def process_caption(lines):
     """
-    Process VTT content:
-    - Remove WEBVTT header and metadata.
-    - Extract the start timestamp and text content from each caption block.
+    Process one caption block (its lines, without the separating blank line):
+    - Skip the WEBVTT header and NOTE/STYLE metadata blocks.
+    - Extract the start timestamp and text content.
     - Apply basic text cleaning.
+    Returns "HH:MM:SS text", or None if the block has no timestamped text.
     """
-    # Remove the WEBVTT header and any initial metadata lines until the first blank line
-    content = re.sub(r'^WEBVTT.*?\n\n', '', content, flags=re.DOTALL | re.IGNORECASE)
-    # Remove NOTE blocks
-    content = re.sub(r'NOTE.*?\n\n', '', content, flags=re.DOTALL)
-    # Remove STYLE blocks
-    content = re.sub(r'STYLE.*?\n\n', '', content, flags=re.DOTALL)
-
-    # Split into caption blocks based on double newlines
-    captions = re.split(r'\n\n+', content.strip())
-    processed_lines = []
-
-    for caption in captions:
-        lines = caption.strip().split('\n')
-        if not lines:
-            continue
-
-        # Find the timestamp line (e.g., [00:00:01.000 --> 00:00:05.000] or 00:00:01.000 --> 00:00:05.000)
-        timestamp_line = ""
-        text_lines = []
-        for i, line in enumerate(lines):
-            if '-->' in line:
-                timestamp_line = line.strip('[]')  # Remove surrounding brackets if present
-                text_lines = lines[i+1:] # Text is everything after the timestamp line
-                break
-        
-        if not timestamp_line:
-            # Skip blocks without a valid timestamp line
-            # print(f"Skipping block without timestamp: {caption[:50]}...", file=sys.stderr)
-            continue
-
-        # Extract the start timestamp (HH:MM:SS)
-        match = re.match(r'(\d{2}:\d{2}:\d{2})\.\d{3}\s*-->', timestamp_line)
-        if not match:
-            # print(f"Skipping block with malformed timestamp: {timestamp_line}", file=sys.stderr)
-            continue
-        
-        start_ts = match.group(1)
-        
-        # Join text lines and clean them
-        raw_text = " ".join(text_lines).strip()
-        cleaned_line_text = clean_text(raw_text) # Use existing clean_text function
-
-        if cleaned_line_text: # Only add if there's actual text content
-            processed_lines.append(f"{start_ts} {cleaned_line_text}")
-
-    return "\n".join(processed_lines)
+    first = lines[0].lstrip()
+    if first[:6].upper() == 'WEBVTT' or first.startswith(('NOTE', 'STYLE')):
+        return None
 
-def remove_line_stuttering(transcript, similarity_threshold=0.8):
+    # Find the timestamp line (e.g., [00:00:01.000 --> 00:00:05.000] or 00:00:01.000 --> 00:00:05.000)
+    timestamp_line = ""
+    text_lines = []
+    for i, line in enumerate(lines):
+        if '-->' in line:
+            timestamp_line = line.strip('[]')  # Remove surrounding brackets if present
+            text_lines = lines[i+1:] # Text is everything after the timestamp line
+            break
+
+    if not timestamp_line:
+        # Skip blocks without a valid timestamp line
+        return None
+
+    # Extract the start timestamp (HH:MM:SS)
+    match = _TS_RANGE_RE.match(timestamp_line)
+    if not match:
+        return None
+
+    start_ts = match.group(1)
+
+    # Join text lines and clean them
+    raw_text = " ".join(text_lines).strip()
+    cleaned_line_text = clean_text(raw_text) # Use existing clean_text function
+
+    if not cleaned_line_text: # Only emit if there's actual text content
+        return None
+    return f"{start_ts} {cleaned_line_text}"
+
+def iter_vtt(lines):
+    """
+    Yield processed captions from an iterable of VTT lines (e.g. an open file).
+    Caption blocks are accumulated until a blank line, so only one block is held in memory.
+    """
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line:
+            block.append(line)
+        elif block:
+            caption = process_caption(block)
+            if caption:
+                yield caption
+            block = []
+    if block:
+        caption = process_caption(block)
+        if caption:
+            yield caption
+
+def process_vtt(content):
+    """Process VTT content held in a string; see iter_vtt."""
+    return "\n".join(iter_vtt(content.split('\n')))
+
+def is_similar(a, b, similarity_threshold):
+    """Return True if a and b are at least similarity_threshold (0..1) alike."""
+    # Identical repeats are the common case and need no matcher at all
+    if a == b:
+        return True
+    # Both ratios are at most 2*min(len)/(len_a+len_b); prune hopeless pairs by length
+    len_a, len_b = len(a), len(b)
+    if 2 * min(len_a, len_b) < similarity_threshold * (len_a + len_b):
+        return False
+    if _fuzz_ratio is not None:
+        # score_cutoff lets rapidfuzz bail out early; below it the score is 0
+        cutoff = similarity_threshold * 100
+        return _fuzz_ratio(a, b, score_cutoff=cutoff) >= cutoff
+    return difflib.SequenceMatcher(None, a, b).ratio() >= similarity_threshold
+
+def iter_unique_lines(lines, similarity_threshold=0.8):
     """
-    Remove near-duplicate lines that may have resulted from incremental candidate updates.
+    Yield lines, dropping near-duplicates of the previously kept line that may have
+    resulted from incremental candidate updates.
     Lines with [SPEAKER_TURN] are always preserved.
     """
-    lines = transcript.splitlines()
-    deduped = []
+    prev_stripped = None
     for line in lines:
-        if not deduped:
-            deduped.append(line)
-        else:
-            prev_line = deduped[-1]
-            # Retention trigger: always preserve lines with [SPEAKER_TURN]
-            if '[SPEAKER_TURN]' in line:
-                deduped.append(line)
-            # Use difflib to compare similarity for lines without [SPEAKER_TURN]
-            elif difflib.SequenceMatcher(None, prev_line.strip(), line.strip()).ratio() >= similarity_threshold:
+        stripped = line.strip()
+        # Retention trigger: always preserve lines with [SPEAKER_TURN]
+        if prev_stripped is not None and '[SPEAKER_TURN]' not in line:
+            # Compare against the stripped form of the last kept line, computed once
+            if is_similar(prev_stripped, stripped, similarity_threshold):
                 continue
-            else:
-                deduped.append(line)
-    return "\n".join(deduped)
+        yield line
+        prev_stripped = stripped
+
+def remove_line_stuttering(transcript, similarity_threshold=0.8):
+    """Remove near-duplicate lines from a transcript string; see iter_unique_lines."""
+    return "\n".join(iter_unique_lines(transcript.splitlines(), similarity_threshold))
 
 def remove_word_stuttering(text):
     """
-    Remove repeated adjacent words (e.g., "hello hello") which may occur in candidate mismatches.
+    Remove repeated adjacent words (e.g., "hello hello", "store store.", "(um um)") which may occur in candidate mismatches.
+    Repeats are matched case-insensitively on the word with surrounding punctuation stripped;
+    the first token's leading punctuation and the repeat's trailing punctuation are kept.
     """
-    stutter_pattern = re.compile(r'\b(\w+)\s+\1\b', re.IGNORECASE)
-    prev_text = None
-    while text != prev_text:
-        prev_text = text
-        text = stutter_pattern.sub(r'\1', text)
-    
-    # Also remove triple+ word repetitions (e.g., "hello hello hello")
-    triple_pattern = re.compile(r'\b(\w+)(\s+\1){2,}\b', re.IGNORECASE)
-    text = triple_pattern.sub(r'\1', text)
-    
-    return text
+    out_lines = []
+    for line in text.split('\n'):
+        # Single left-to-right pass over whitespace tokens
+        out = []
+        prev = None
+        for tok in line.split():
+            key = tok.strip(string.punctuation).lower()
+            # Fold only when nothing separates the words, as \b(\w+)\s+\1\b did:
+            # "store, store" and "the. the" are left alone
+            if (key and key == prev
+                    and out[-1][-1] not in string.punctuation
+                    and tok[0] not in string.punctuation):
+                out[-1] += tok[len(tok.rstrip(string.punctuation)):]
+            else:
+                out.append(tok)
+                prev = key
+        out_lines.append(' '.join(out))
+    return '\n'.join(out_lines)
 
-def clean_transcript(raw_text, is_vtt=False):
+def iter_clean_transcript(lines, is_vtt=False):
     """
     If the source is VTT, process it with VTT cleaning.
-    Then apply line and word stutter removal.
+    Otherwise clean each line, then apply line and word stutter removal.
+    Lines are consumed and yielded one at a time.
     """
     if is_vtt:
-        processed = process_vtt(raw_text)
+        yield from iter_vtt(lines)
         # Stutter removal might be less necessary after VTT processing,
         # but can be kept if needed. Consider if it removes valid repetitions.
-        # processed = remove_line_stuttering(processed) # Optional: Re-evaluate if needed
-        # processed = remove_word_stuttering(processed) # Optional: Re-evaluate if needed
+        # Optional: Re-evaluate if needed by wrapping with iter_unique_lines / remove_word_stuttering
     else:
-        # Apply cleaning to non-VTT text as well if desired
-        processed = clean_text(raw_text) # Apply basic cleaning
-        processed = remove_line_stuttering(processed)
-        processed = remove_word_stuttering(processed)
-    return processed
+        # Apply basic cleaning to non-VTT text as well, dropping lines left empty
+        cleaned = (clean_text(line) for line in lines)
+        for line in iter_unique_lines(line for line in cleaned if line):
+            yield remove_word_stuttering(line)
+
+def clean_transcript(raw_text, is_vtt=False):
+    """Clean a transcript held in a string; see iter_clean_transcript."""
+    return "\n".join(iter_clean_transcript(raw_text.split('\n'), is_vtt=is_vtt))
+
+def sniff_vtt(lines):
+    """
+    Consume leading lines until VTT_SNIFF_LINES non-blank lines (or EOF) have been seen,
+    and report whether they look like VTT: the first non-blank line starts with WEBVTT,
+    or any of them contains a bracketed "[00:00:" timestamp.
+    Returns (is_vtt, head) where head holds every consumed line, to be replayed.
+    """
+    head = []
+    non_blank = []
+    for line in lines:
+        head.append(line)
+        if line.strip():
+            non_blank.append(line)
+            if len(non_blank) >= VTT_SNIFF_LINES:
+                break
+    is_vtt = bool(non_blank) and (
+        non_blank[0].lstrip().startswith('WEBVTT') or any('[00:00:' in line for line in non_blank)
+    )
+    return is_vtt, head
 
 def main():
-    raw_text = sys.stdin.read()
-    # Detect if the file is VTT by extension or by header content.
+    lines = iter(sys.stdin)
+    # Detect if the file is VTT by extension or by header content; only the head of
+    # the stream is buffered for this, then replayed ahead of the rest
     filename = os.environ.get('filename', '')
-    is_vtt = filename.lower().endswith('.vtt') or raw_text.startswith('WEBVTT') or '[00:00:' in raw_text
-    cleaned_text = clean_transcript(raw_text, is_vtt=is_vtt)
-    print(cleaned_text)
+    is_vtt, head = sniff_vtt(lines)
+    is_vtt = is_vtt or filename.lower().endswith('.vtt')
+    write = sys.stdout.write
+    for line in iter_clean_transcript(itertools.chain(head, lines), is_vtt=is_vtt):
+        write(line)
+        write('\n')
 
 if __name__ == "__main__":
     main()
@@ -3,9 +3,45 @@ from PIL import Image
 import pytesseract
 from pathlib import Path
 import json
-from typing import Dict, List
-from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Tuple
 import multiprocessing
+import multiprocessing.util
+
+try:
+    # In-process tesseract API: no fork/exec or temp PNG per image
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Upper bound handed to JPEG draft mode; decoding stops at the smallest DCT
+# scale that still covers this size
+DRAFT_SIZE = (2000, 2000)
+
+# Per-worker tesseract handle, created once by init_worker
+_tess_api = None
+
+def init_worker():
+    """Pool initializer: load tesseract's language data once per worker process."""
+    global _tess_api
+    if tesserocr is None:
+        return
+    try:
+        api = tesserocr.PyTessBaseAPI()
+    except RuntimeError as e:
+        # e.g. tessdata not found; an initializer that raises makes the pool
+        # respawn workers forever, so fall back to pytesseract instead
+        print(f"tesserocr unavailable, using pytesseract: {e}")
+        return
+    _tess_api = api
+    # Release the API when the worker exits cleanly (pool.close() + join())
+    multiprocessing.util.Finalize(None, api.End, exitpriority=10)
+
+def image_to_text(img: Image.Image) -> str:
+    """Run OCR on a PIL image, via tesserocr when available, else pytesseract."""
+    if _tess_api is not None:
+        _tess_api.SetImage(img)
+        return _tess_api.GetUTF8Text()
+    return pytesseract.image_to_string(img)
 
 def process_image(args) -> tuple:
     """
@@ -23,8 +59,12 @@ def process_image(args) -> tuple:
         
         # Open and process image
         with Image.open(image_path) as img:
-            # Extract text using pytesseract
-            text = pytesseract.image_to_string(img)
+            # Let libjpeg decode straight to grayscale at reduced scale; tesseract
+            # works on grayscale internally anyway
+            img.draft('L', DRAFT_SIZE)
+            img = img.convert('L')
+            # Extract text using tesseract
+            text = image_to_text(img)
             
             # Save individual text file
             text_filename = Path(filename).stem + '.txt'
@@ -39,17 +79,21 @@ def process_image(args) -> tuple:
         print(f"Error processing {filename}: {str(e)}")
         return filename, f"ERROR: {str(e)}"
 
-def process_directory(input_dir: str, output_dir: str, max_workers: int = None) -> Dict[str, str]:
+def iter_directory(input_dir: str, output_dir: str, max_workers: int = None) -> Iterator[Tuple[str, str]]:
     """
-    Process all JPEG files in a directory and perform OCR using multiple processes.
+    Perform OCR on all JPEG files in a directory using multiple processes,
+    yielding results as they complete.
     
     Args:
         input_dir: Directory containing JPEG files
         output_dir: Directory to save OCR results
         max_workers: Maximum number of worker processes (defaults to CPU count)
         
-    Returns:
-        Dictionary mapping filenames to extracted text
+    Yields:
+        (filename, extracted_text) tuples, in completion order. Each result is also
+        appended to ocr_results.json in output_dir as it arrives, so nothing is
+        accumulated in memory. If iteration stops early, the file holds the
+        results yielded so far as a valid JSON object.
     """
     # Create output directory if it doesn't exist
     Path(output_dir).mkdir(parents=True, exist_ok=True)
@@ -58,30 +102,58 @@ def process_directory(input_dir: str, output_dir: str, max_workers: int = None)
     if max_workers is None:
         max_workers = multiprocessing.cpu_count()
     
-    # Supported image extensions
-    valid_extensions = {'.jpg', '.jpeg', '.JPG', '.JPEG'}
+    # Supported image extensions (matched case-insensitively)
+    valid_extensions = ('.jpg', '.jpeg')
     
-    # Get list of valid image files
-    image_files = [
-        f for f in os.listdir(input_dir) 
-        if Path(f).suffix in valid_extensions
-    ]
+    # Get list of valid image files; scandir entries carry the file type from
+    # the directory listing, so no Path object or extra stat per name
+    with os.scandir(input_dir) as entries:
+        image_files = [
+            e.name for e in entries
+            if e.name.lower().endswith(valid_extensions) and e.is_file()
+        ]
     
     # Prepare arguments for worker processes
     work_args = [(f, input_dir, output_dir) for f in image_files]
     
-    # Process files concurrently
-    results = {}
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        for filename, text in executor.map(process_image, work_args):
-            results[filename] = text
-    
-    # Save consolidated results to JSON
+    # Process files concurrently; results are collected as they complete so a
+    # slow page doesn't hold up the ones behind it. Each result is appended to
+    # the consolidated JSON object straight away instead of accumulating in a dict.
+    count = 0
+    chunksize = max(1, len(work_args) // (max_workers * 4))
     json_path = os.path.join(output_dir, 'ocr_results.json')
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    with open(json_path, 'w', encoding='utf-8') as f_json, \
+            multiprocessing.Pool(max_workers, initializer=init_worker) as pool:
+        f_json.write('{')
+        try:
+            for filename, text in pool.imap_unordered(process_image, work_args, chunksize=chunksize):
+                f_json.write(',\n  ' if count else '\n  ')
+                f_json.write(json.dumps(filename, ensure_ascii=False) + ': ' + json.dumps(text, ensure_ascii=False))
+                count += 1
+                yield filename, text
+        finally:
+            # Close the object even if the caller stops early or raises, so a
+            # partial run still leaves valid (truncated) JSON
+            f_json.write('\n}' if count else '}')
+        # Let workers exit normally so their finalizers (tesserocr End()) run;
+        # leaving the with block alone would terminate them
+        pool.close()
+        pool.join()
+
+def process_directory(input_dir: str, output_dir: str, max_workers: int = None) -> Dict[str, str]:
+    """
+    Process all JPEG files in a directory and perform OCR using multiple processes.
+    
+    Args:
+        input_dir: Directory containing JPEG files
+        output_dir: Directory to save OCR results
+        max_workers: Maximum number of worker processes (defaults to CPU count)
         
-    return results
+    Returns:
+        Dictionary mapping filenames to extracted text. Use iter_directory to
+        avoid holding every result in memory.
+    """
+    return dict(iter_directory(input_dir, output_dir, max_workers))
 
 if __name__ == "__main__":
     import argparse
@@ -94,5 +166,6 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
-    results = process_directory(args.input_dir, args.output_dir, args.workers)
-    print(f"\nProcessed {len(results)} files. Results saved to {args.output_dir}")
+    # Stream results; only ocr_results.json and the per-file .txt outputs keep them
+    count = sum(1 for _ in iter_directory(args.input_dir, args.output_dir, args.workers))
+    print(f"\nProcessed {count} files. Results saved to {args.output_dir}")
@@ -6,6 +6,7 @@ Converts documents (PDF, images, video frames) to text using NVIDIA's Nemotron P
 
 Requirements:
   - NVIDIA_API_KEY environment variable set
+  - requests (pip install requests)
   - pdftoppm (for PDF conversion)
   - ffmpeg (for video/image conversion)
 
@@ -17,71 +18,127 @@ Usage:
 
 import argparse
 import base64
+import hashlib
 import json
 import os
+import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from orjson import loads as json_loads  # C-backed, faster on large responses
+except ImportError:
+    from json import loads as json_loads
+
 # Default values
 DEFAULT_MODEL = "nvidia/nemotron-parse"
 DEFAULT_DPI = 200
 DEFAULT_MAX_TOKENS = 4096
 API_RATE_LIMIT = 0.3  # seconds between requests
+DEFAULT_WORKERS = 8  # concurrent API requests
+API_URL = "https://integrate.api.nvidia.com/v1/chat/completions"
+
+# Shared session so TCP/TLS connections are reused across requests and threads
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=DEFAULT_WORKERS, pool_maxsize=DEFAULT_WORKERS))
+
+
+class RateLimiter:
+    """Space out calls across threads so one starts at most every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        """Block until the caller's slot comes up."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
 
 
 def check_dependencies() -> dict:
     """Check which conversion tools are available."""
+    # shutil.which scans PATH in-process instead of spawning `which` per tool
     tools = {
-        "pdftoppm": None,
-        "ffmpeg": None,
-        "sips": None,  # macOS built-in
-        "magick": None,  # ImageMagick
+        tool: shutil.which(tool)
+        for tool in (
+            "pdftoppm",
+            "ffmpeg",
+            "sips",  # macOS built-in
+            "magick",  # ImageMagick
+        )
     }
 
-    for tool in tools:
-        try:
-            result = subprocess.run(
-                ["which", tool],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            tools[tool] = result.stdout.strip() if result.returncode == 0 else None
-        except Exception:
-            tools[tool] = None
-
     # Special check for sips (macOS)
-    if sys.platform == "darwin":
-        try:
-            subprocess.run(["sips", "--version"], capture_output=True, timeout=5)
-            tools["sips"] = "/usr/bin/sips"
-        except Exception:
-            pass
+    if sys.platform == "darwin" and not tools["sips"] and os.path.exists("/usr/bin/sips"):
+        tools["sips"] = "/usr/bin/sips"
 
     return tools
 
 
+def pdf_page_count(pdf_path: str) -> Optional[int]:
+    """Return the page count reported by pdfinfo, or None if it can't be determined."""
+    try:
+        result = subprocess.run(["pdfinfo", pdf_path], capture_output=True, text=True, timeout=30)
+    except Exception:
+        return None
+
+    for line in result.stdout.splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split()[1])
+    return None
+
+
 def pdf_to_pages(pdf_path: str, output_dir: str, dpi: int = DEFAULT_DPI, max_pages: int = None) -> List[str]:
-    """Convert PDF to individual PNG pages using pdftoppm."""
+    """Convert PDF to individual PNG pages using pdftoppm, one process per page range."""
     pdf_name = Path(pdf_path).stem
-    cmd = [
-        "pdftoppm",
-        "-png",
-        "-r", str(dpi),
-    ]
 
-    # Add page range limit if specified
-    if max_pages:
-        cmd.extend(["-l", str(max_pages)])
+    # pdftoppm is single-threaded, so split the pages into one range per core
+    # and rasterise the ranges concurrently
+    last_page = pdf_page_count(pdf_path)
+    if last_page and max_pages:
+        last_page = min(last_page, max_pages)
 
-    cmd.extend([pdf_path, f"{output_dir}/{pdf_name}"])
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"pdftoppm failed: {result.stderr}")
+    if last_page:
+        step = -(-last_page // min(os.cpu_count() or 1, last_page))
+        ranges = [(first, min(first + step - 1, last_page)) for first in range(1, last_page + 1, step)]
+    else:
+        # Page count unknown: single pass, honouring the page range limit if specified
+        ranges = [(None, max_pages)]
+
+    def run_range(page_range: tuple) -> subprocess.CompletedProcess:
+        first, last = page_range
+        cmd = [
+            "pdftoppm",
+            "-png",
+            "-r", str(dpi),
+        ]
+        if first:
+            cmd.extend(["-f", str(first)])
+        if last:
+            cmd.extend(["-l", str(last)])
+        cmd.extend([pdf_path, f"{output_dir}/{pdf_name}"])
+        return subprocess.run(cmd, capture_output=True, text=True)
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        for result in executor.map(run_range, ranges):
+            if result.returncode != 0:
+                raise RuntimeError(f"pdftoppm failed: {result.stderr}")
 
     # Find generated files
     pattern = f"{pdf_name}-*.png"
@@ -111,24 +168,26 @@ def video_to_frames(video_path: str, output_dir: str, num_frames: int = 10) -> L
     video_name = Path(video_path).stem
     output_pattern = str(Path(output_dir) / f"{video_name}_%03d.png")
 
-    # Calculate frame interval
+    # Read the duration from the container header (no packet scan) and sample
+    # frames evenly by timestamp with the fps filter instead of select on every frame
     probe_cmd = [
-        "ffprobe", "-v", "error", "-select_streams", "v:0",
-        "-count_packets", "-show_entries", "stream=nb_read_packets",
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
         "-of", "csv=p=0", str(video_path)
     ]
 
     try:
         result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=30)
-        total_frames = int(result.stdout.strip().split(",")[0])
-        interval = max(1, total_frames // num_frames)
+        duration = result.stdout.strip()
+        # fps accepts a rational, so pass frames/seconds through unformatted
+        sample_filter = ["-vf", f"fps={num_frames}/{duration}"] if float(duration) > 0 else []
     except Exception:
-        interval = 1
+        sample_filter = []
 
     cmd = [
         "ffmpeg", "-i", str(video_path),
-        "-vf", f"select='not(mod(n\\,{interval}))'",
-        "-vsync", "0", "-frames:v", str(num_frames),
+        *sample_filter,
+        "-frames:v", str(num_frames),
         output_pattern
     ]
 
@@ -189,11 +248,10 @@ def prepare_images(input_paths: List[str], output_dir: str, **kwargs) -> List[di
     return images
 
 
-def ocr_with_nvidia(image_path: str, api_key: str, model: str = DEFAULT_MODEL) -> Optional[str]:
-    """Send image to NVIDIA Nemotron Parse API and return extracted text."""
-    with open(image_path, "rb") as f:
-        img_b64 = base64.b64encode(f.read()).decode()
-
+@lru_cache(maxsize=None)
+def _payload_parts(model: str) -> tuple:
+    """Return the JSON request body for `model` as bytes, split where the base64 image goes."""
+    slot = "@IMAGE_B64@"
     payload = {
         "model": model,
         "tools": [{"type": "function", "function": {"name": "markdown_no_bbox"}}],
@@ -201,34 +259,77 @@ def ocr_with_nvidia(image_path: str, api_key: str, model: str = DEFAULT_MODEL) -
             "role": "user",
             "content": [{
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{img_b64}"}
+                "image_url": {"url": f"data:image/png;base64,{slot}"}
             }]
         }],
         "temperature": 0.0,
         "max_tokens": DEFAULT_MAX_TOKENS
     }
+    head, tail = json.dumps(payload).split(slot)
+    return head.encode(), tail.encode()
 
-    # Write payload to temp file to avoid argument list length limit
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-        json.dump(payload, f)
-        payload_file = f.name
 
-    try:
-        result = subprocess.run([
-            "curl", "-s", "https://integrate.api.nvidia.com/v1/chat/completions",
-            "-H", f"Authorization: Bearer {api_key}",
-            "-H", "Content-Type: application/json",
-            "-d", f"@{payload_file}"
-        ], capture_output=True, text=True, timeout=60)
-    finally:
-        os.unlink(payload_file)
+def file_digest(path: str) -> bytes:
+    """Return a BLAKE2b digest of the file's contents."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def find_duplicate_images(images: List[dict]) -> dict:
+    """
+    Map the index of each image whose file duplicates an earlier one to the
+    index of that first occurrence.
+
+    Files are grouped by size first, so only images sharing a size are hashed.
+    """
+    by_size = {}
+    for i, img in enumerate(images):
+        by_size.setdefault(os.path.getsize(img["path"]), []).append(i)
+
+    duplicates = {}
+    for indexes in by_size.values():
+        if len(indexes) < 2:
+            continue
+        first_seen = {}
+        for i in indexes:
+            digest = file_digest(images[i]["path"])
+            if digest in first_seen:
+                duplicates[i] = first_seen[digest]
+            else:
+                first_seen[digest] = i
+    return duplicates
+
+
+def ocr_with_nvidia(image_path: str, api_key: str, model: str = DEFAULT_MODEL) -> Optional[str]:
+    """Send image to NVIDIA Nemotron Parse API and return extracted text."""
+    with open(image_path, "rb") as f:
+        img_b64 = base64.b64encode(f.read())
+
+    # base64 output needs no JSON escaping, so splice the bytes straight into the
+    # pre-serialised body instead of decoding and re-encoding the whole payload
+    head, tail = _payload_parts(model)
+    body = b"".join((head, img_b64, tail))
+    del img_b64
 
     try:
-        resp = json.loads(result.stdout)
+        result = _SESSION.post(
+            API_URL,
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            data=body,
+            timeout=60
+        )
+        result.raise_for_status()
+        if not result.content:
+            print("  API error: empty response")
+            return None
+        resp = json_loads(result.content)
         tool_calls = resp.get('choices', [{}])[0].get('message', {}).get('tool_calls', [])
         if tool_calls:
             args = tool_calls[0].get('function', {}).get('arguments', '[]')
-            return json.loads(args)[0].get('text', '')
+            return json_loads(args)[0].get('text', '')
     except Exception as e:
         print(f"  API error: {e}")
 
@@ -247,6 +348,7 @@ def main():
     parser.add_argument("--frames", type=int, default=10, help="Frames per video (default: 10)")
     parser.add_argument("--max-pages", type=int, default=None, help="Max pages per PDF to process")
     parser.add_argument("--model", default=DEFAULT_MODEL, help="NVIDIA model name")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Concurrent API requests (default: {DEFAULT_WORKERS})")
     parser.add_argument("--temp-dir", help="Temporary directory for conversions")
     parser.add_argument("--keep-temp", action="store_true", help="Keep temporary files")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done without OCR")
@@ -281,24 +383,45 @@ def main():
                 print(f"  {img['path']} <- {img['source']} (page {img['page']})")
             sys.exit(0)
 
-        # Process images
+        # Process images. Requests are I/O bound, so threads overlap the HTTP
+        # round-trips while the limiter keeps request starts API_RATE_LIMIT apart.
+        limiter = RateLimiter(API_RATE_LIMIT)
+
+        def ocr_image(img: dict) -> Optional[str]:
+            limiter.wait()
+            return ocr_with_nvidia(img['path'], api_key, args.model)
+
+        # Identical pages/frames are sent once and share the result
+        duplicates = find_duplicate_images(images)
+        if duplicates:
+            print(f"Skipping {len(duplicates)} duplicate images")
+
+        texts = {}
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = {
+                executor.submit(ocr_image, img): i
+                for i, img in enumerate(images) if i not in duplicates
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                text = future.result()
+                texts[i] = text
+                print(f"\n[{done}/{len(futures)}] OCR: {Path(images[i]['path']).name}")
+                if text:
+                    print(f"  Extracted {len(text)} characters")
+                else:
+                    print(f"  Failed to extract text")
+
+        # Assemble in input order regardless of completion order
         results = []
-        for i, img in enumerate(images, 1):
-            print(f"\n[{i}/{len(images)}] OCR: {Path(img['path']).name}")
-            text = ocr_with_nvidia(img['path'], api_key, args.model)
-
+        for i, img in enumerate(images):
+            text = texts[duplicates.get(i, i)]
             if text:
                 separator = f"\n{'='*60}\n"
                 source_info = f"SOURCE: {img['source']}"
                 page_info = f"PAGE: {img['page']}" if img['page'] > 1 else ""
                 header = f"{separator}{source_info} {page_info}\n{separator}"
                 results.append(header + text)
-                print(f"  Extracted {len(text)} characters")
-            else:
-                print(f"  Failed to extract text")
-
-            import time
-            time.sleep(API_RATE_LIMIT)
 
         # Output results
         output_text = "\n".join(results)
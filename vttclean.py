@@ -6,62 +6,64 @@ import datetime
 import glob
 import sys
 
+# Patterns are compiled once at import since they run per line/caption. _TS_RE
+# matches a cue's timing line and captures only the start time, without milliseconds
+_TS_RE = re.compile(r'(\d{2}:\d{2}:\d{2})\.\d{3}[ \t]+-->', re.ASCII)
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+
 def clean_text(text):
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
+    # Remove HTML tags; most caption text has none, so skip the regex unless a '<' is present
+    if '<' in text:
+        text = _TAG_RE.sub('', text)
     # Remove multiple spaces
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     # Remove leading/trailing whitespace
     return text.strip()
 
 def is_prefix(a, b):
     return b.startswith(a)
 
-def process_vtt(content):
-    # Remove WEBVTT header and metadata
-    content = re.sub(r'^WEBVTT\n.*?\n\n', '', content, flags=re.DOTALL)
-
-    # Split into captions
-    captions = re.split(r'\n\n+', content)
-
-    processed_captions = []
-    buffer = []
-
-    def flush_buffer():
-        if buffer:
-            parts_first = buffer[0].split(' ', 2)
-            parts_last = buffer[-1].split(' ', 2)
-            if len(parts_first) >= 2 and len(parts_last) >= 3:
-                first_label = parts_first[1]
-                last_text = parts_last[2]
-                processed_captions.append(f"{first_label} {last_text}")
-            buffer.clear()
-
-    for caption in captions:
-        lines = caption.split('\n')
-        if len(lines) >= 2:
-            # Extract only the start time and remove milliseconds
-            timestamp_match = re.match(r'(\d{2}:\d{2}:\d{2})\.(\d{3})', lines[0])
+def iter_cues(lines):
+    # Yield (timestamp, text) for each cue in an iterable of VTT lines, one cue at a time
+    timestamp = None
+    text_lines = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if timestamp is None:
+            # Outside a cue: skip the WEBVTT header, metadata and cue identifiers
+            timestamp_match = _TS_RE.match(line)
             if timestamp_match:
-                timestamp = f"{timestamp_match.group(1)}"
-                text = ' '.join(lines[1:])
-                clean_caption = clean_text(text)
-                if clean_caption:
-                    current_line = f"{timestamp} {clean_caption}"
+                timestamp = timestamp_match.group(1)
+        elif line:
+            text_lines.append(line)
+        else:
+            yield timestamp, ' '.join(text_lines)
+            timestamp = None
+            text_lines = []
+    if timestamp is not None:
+        yield timestamp, ' '.join(text_lines)
 
-                    if not buffer:
-                        buffer.append(current_line)
-                    else:
-                        _, prev_text = buffer[-1].split(' ', 1)
-                        if is_prefix(prev_text, clean_caption):
-                            buffer.append(current_line)
-                        else:
-                            flush_buffer()
-                            buffer.append(current_line)
+def iter_vtt(lines):
+    # Yield cleaned "HH:MM:SS text" captions from an iterable of VTT lines (e.g. an open file).
+    # Runs of incremental captions (each extending the previous one) are merged into
+    # the first timestamp and the last, most complete text.
+    first_timestamp = last_text = None
+    for timestamp, text in iter_cues(lines):
+        clean_caption = clean_text(text)
+        if not clean_caption:
+            continue
+        if last_text is not None:
+            if is_prefix(last_text, clean_caption):
+                last_text = clean_caption
+                continue
+            yield f"{first_timestamp} {last_text}"
+        first_timestamp, last_text = timestamp, clean_caption
+    if last_text is not None:
+        yield f"{first_timestamp} {last_text}"
 
-    flush_buffer()  # Don't forget to flush the buffer at the end
-
-    return '\n'.join(processed_captions)
+def process_vtt(content):
+    return '\n'.join(iter_vtt(content.split('\n')))
 
 if __name__ == "__main__":
     try:
@@ -72,9 +74,10 @@ if __name__ == "__main__":
         file_pattern = sys.argv[1]
         for filename in glob.glob(file_pattern):
             with open(filename, 'r', encoding='utf-8') as file:
-                content = file.read()
-                result = process_vtt(content)
-                print(result)
+                # Stream captions straight to stdout; the file is never read whole
+                for caption in iter_vtt(file):
+                    sys.stdout.write(caption)
+                    sys.stdout.write('\n')
     except Exception as e:
         print(f"Error processing input: {e}", file=sys.stderr)
         sys.exit(1)
\ No newline at end of file